@@ -70,6 +70,12 @@ class Config:
     def set_remote_function_list_path(self, path: str | None):
         self.remote_function_list_path = path
 
+    @staticmethod
+    def get_snowflake_warmup_connection_info() -> str | None:
+        # Read on demand rather than kept as an attribute so the credentials
+        # are never exposed through the /config endpoint.
+        return os.getenv("SNOWFLAKE_WARMUP_CONNECTION_INFO")
+
 
 config = Config()
 
@@ -1,5 +1,6 @@
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
+from threading import Thread
 from typing import TypedDict
 from uuid import uuid4
 
@@ -11,8 +12,9 @@ from starlette.responses import PlainTextResponse
 
 from app.config import get_config
 from app.mdl.java_engine import JavaEngineConnector
-from app.middleware import ProcessTimeMiddleware, RequestLogMiddleware
+from app.middleware import RequestLogMiddleware
 from app.model import ConfigModel, CustomHttpError
+from app.model.metadata.snowflake import warmup_connection_pool
 from app.routers import v2, v3
 
 get_config().init_logger()
@@ -26,6 +28,10 @@ class State(TypedDict):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[State]:
+    # Log in to the configured Snowflake accounts in the background so the first
+    # metadata request does not pay for it. It is a no-op when none are set. The
+    # thread is a daemon so a slow or hanging login never holds up shutdown.
+    Thread(target=warmup_connection_pool, name="snowflake-warmup", daemon=True).start()
     async with JavaEngineConnector() as java_engine_connector:
         yield {"java_engine_connector": java_engine_connector}
 
@@ -34,11 +40,10 @@ app = FastAPI(lifespan=lifespan)
 app.include_router(v2.router)
 app.include_router(v3.router)
 app.add_middleware(RequestLogMiddleware)
-app.add_middleware(ProcessTimeMiddleware)
 app.add_middleware(
     CorrelationIdMiddleware,
     header_name="X-Correlation-ID",
-    generator=lambda: str(uuid4()),
+    generator=lambda: uuid4().hex,
 )
 
 
@@ -1,5 +1,6 @@
 import time
 
+from anyio import to_thread
 from loguru import logger
 from orjson import orjson
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -9,6 +10,7 @@ from starlette.responses import Response
 
 class RequestLogMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next) -> Response:
+        start_time = time.perf_counter()
         correlation_id = request.headers.get("X-Correlation-ID")
         with logger.contextualize(correlation_id=correlation_id):
             logger.info("{method} {path}", method=request.method, path=request.url.path)
@@ -21,18 +23,15 @@ class RequestLogMiddleware(BaseHTTPMiddleware):
                 body = orjson.dumps(json_obj)
             logger.info("Request body: {body}", body=body.decode("utf-8"))
             try:
-                return await call_next(request)
+                response = await call_next(request)
+                process_time = time.perf_counter() - start_time
+                response.headers["X-Process-Time"] = str(process_time)
+                return response
             except Exception as exc:
-                logger.opt(exception=exc).error("Request failed")
+                # Formatting the traceback is slow, keep it off the event loop
+                await to_thread.run_sync(
+                    logger.opt(exception=exc).error, "Request failed"
+                )
                 raise exc
             finally:
                 logger.info("Request ended")
-
-
-class ProcessTimeMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next) -> Response:
-        start_time = time.perf_counter()
-        response = await call_next(request)
-        process_time = time.perf_counter() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
@@ -0,0 +1,50 @@
+import hashlib
+from functools import wraps
+from threading import Lock
+
+import orjson
+from cachetools import TTLCache
+from pydantic import SecretStr
+
+from app.model import ConnectionInfo
+
+_cache = TTLCache(maxsize=256, ttl=300)
+_lock = Lock()
+
+
+def _reveal(value):
+    if isinstance(value, SecretStr):
+        return value.get_secret_value()
+    raise TypeError
+
+
+def fingerprint(connection_info: ConnectionInfo) -> str:
+    # Secrets are part of the key so that a cached result is only served to a
+    # caller presenting the same credentials.
+    dumped = orjson.dumps(
+        connection_info.model_dump(), default=_reveal, option=orjson.OPT_SORT_KEYS
+    )
+    return hashlib.sha256(dumped).hexdigest()
+
+
+def cache_metadata(method):
+    # The cached value is shared between requests, callers must not mutate it.
+    @wraps(method)
+    def wrapper(self):
+        key = (fingerprint(self.connection_info), method.__name__)
+        with _lock:
+            if key in _cache:
+                return _cache[key]
+        result = method(self)
+        with _lock:
+            _cache[key] = result
+        return result
+
+    return wrapper
+
+
+def invalidate_metadata(connection_info: ConnectionInfo) -> None:
+    key_prefix = fingerprint(connection_info)
+    with _lock:
+        for key in [key for key in _cache if key[0] == key_prefix]:
+            _cache.pop(key, None)
@@ -36,7 +36,11 @@ mapping = {
 class MetadataFactory:
     @staticmethod
     def get_metadata(data_source: DataSource, connection_info) -> Metadata:
+        return MetadataFactory.get_metadata_class(data_source)(connection_info)
+
+    @staticmethod
+    def get_metadata_class(data_source: DataSource) -> type[Metadata]:
         try:
-            return mapping[data_source](connection_info)
+            return mapping[data_source]
         except KeyError:
             raise NotImplementedError(f"Unsupported data source: {data_source}")
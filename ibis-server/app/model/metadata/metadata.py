@@ -5,6 +5,9 @@ from app.model.metadata.dto import Constraint, Table
 
 
 class Metadata(ABC):
+    # whether results are kept in app.model.metadata.cache
+    cache_enabled = False
+
     def __init__(self, connection_info: ConnectionInfo):
         self.connection_info = connection_info
 
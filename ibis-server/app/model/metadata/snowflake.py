@@ -1,7 +1,23 @@
-from contextlib import closing
+from contextlib import closing, contextmanager
+from itertools import groupby
+from operator import attrgetter
+from threading import Lock
+from typing import NamedTuple
 
+from cachetools import TTLCache
+from ibis import BaseBackend
+from loguru import logger
+from pydantic import TypeAdapter
+from snowflake.connector.errors import (
+    DatabaseError,
+    NotSupportedError,
+    ProgrammingError,
+)
+
+from app.config import get_config
 from app.model import SnowflakeConnectionInfo
 from app.model.data_source import DataSource
+from app.model.metadata.cache import cache_metadata, fingerprint
 from app.model.metadata.dto import (
     Column,
     Constraint,
@@ -12,101 +28,331 @@ from app.model.metadata.dto import (
 )
 from app.model.metadata.metadata import Metadata
 
+# all possible types listed here: https://docs.snowflake.com/en/sql-reference/intro-summary-data-types
+_TYPE_MAP = {
+    # Numeric Types
+    "number": RustWrenEngineColumnType.NUMERIC,
+    "decimal": RustWrenEngineColumnType.NUMERIC,
+    "numeric": RustWrenEngineColumnType.NUMERIC,
+    "int": RustWrenEngineColumnType.INTEGER,
+    "integer": RustWrenEngineColumnType.INTEGER,
+    "bigint": RustWrenEngineColumnType.BIGINT,
+    "smallint": RustWrenEngineColumnType.SMALLINT,
+    "tinyint": RustWrenEngineColumnType.TINYINT,
+    "byteint": RustWrenEngineColumnType.TINYINT,
+    # Float
+    "float4": RustWrenEngineColumnType.FLOAT4,
+    "float": RustWrenEngineColumnType.FLOAT8,
+    "float8": RustWrenEngineColumnType.FLOAT8,
+    "double": RustWrenEngineColumnType.DOUBLE,
+    "double precision": RustWrenEngineColumnType.DOUBLE,
+    "real": RustWrenEngineColumnType.REAL,
+    # String Types
+    "varchar": RustWrenEngineColumnType.VARCHAR,
+    "char": RustWrenEngineColumnType.CHAR,
+    "character": RustWrenEngineColumnType.CHAR,
+    "string": RustWrenEngineColumnType.STRING,
+    "text": RustWrenEngineColumnType.TEXT,
+    # Boolean
+    "boolean": RustWrenEngineColumnType.BOOL,
+    # Date and Time Types
+    "date": RustWrenEngineColumnType.DATE,
+    "datetime": RustWrenEngineColumnType.TIMESTAMP,
+    "timestamp": RustWrenEngineColumnType.TIMESTAMP,
+    "timestamp_ntz": RustWrenEngineColumnType.TIMESTAMP,
+    "timestamp_tz": RustWrenEngineColumnType.TIMESTAMPTZ,
+}
+
+_TABLE_LIST_SQL = """
+    SELECT
+        c.TABLE_CATALOG AS TABLE_CATALOG,
+        c.TABLE_SCHEMA AS TABLE_SCHEMA,
+        c.TABLE_NAME AS TABLE_NAME,
+        c.COLUMN_NAME AS COLUMN_NAME,
+        c.DATA_TYPE AS DATA_TYPE,
+        c.IS_NULLABLE AS IS_NULLABLE,
+        c.COMMENT AS COLUMN_COMMENT,
+        t.COMMENT AS TABLE_COMMENT
+    FROM
+        INFORMATION_SCHEMA.COLUMNS c
+    LEFT JOIN
+        INFORMATION_SCHEMA.TABLES t
+        ON c.TABLE_SCHEMA = t.TABLE_SCHEMA
+        AND c.TABLE_NAME = t.TABLE_NAME
+    WHERE
+        c.TABLE_SCHEMA = %(schema)s
+    ORDER BY
+        c.TABLE_NAME, c.ORDINAL_POSITION
+"""
+
+
+class _TableListRow(NamedTuple):
+    # fields follow the lower-cased aliases of _TABLE_LIST_SQL
+    table_catalog: str
+    table_schema: str
+    table_name: str
+    column_name: str
+    data_type: str
+    is_nullable: str
+    column_comment: str | None
+    table_comment: str | None
+
+
+class _ConstraintRow(NamedTuple):
+    # fields follow the column names of SHOW IMPORTED KEYS
+    pk_schema_name: str
+    pk_table_name: str
+    pk_column_name: str
+    fk_schema_name: str
+    fk_table_name: str
+    fk_column_name: str
+
+
+class _PoolEntry:
+    def __init__(self, connection: BaseBackend):
+        self.connection = connection
+        self.leases = 0
+        self.retired = False
+
+
+class _ConnectionPool(TTLCache):
+    # Entries leaving the pool are collected here for the caller to retire, so
+    # idle ones are logged out after the pool lock is released.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evicted: list[_PoolEntry] = []
+
+    def popitem(self):
+        key, entry = super().popitem()
+        self.evicted.append(entry)
+        return key, entry
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.evicted.extend(entry for _, entry in expired)
+        return expired
+
+    def pop_evicted(self) -> list[_PoolEntry]:
+        evicted, self.evicted = self.evicted, []
+        return evicted
+
+
+# Sessions idle for longer than the ttl are logged out, well before Snowflake
+# expires them on its side, so a pooled connection is safe to use without a ping.
+_connection_pool = _ConnectionPool(maxsize=32, ttl=600)
+_connection_pool_lock = Lock()
+
+# "Actual statement count did not match the desired statement count"
+_STATEMENT_COUNT_MISMATCH_ERRNO = 8
+
+
+def _retire(entries: list[_PoolEntry]) -> list[BaseBackend]:
+    # Must hold the pool lock. A connection still leased out is closed by whoever
+    # releases the last lease, so no query is cut off halfway.
+    closable = []
+    for entry in entries:
+        entry.retired = True
+        if entry.leases == 0:
+            closable.append(entry.connection)
+    return closable
+
+
+def _disconnect(connections: list[BaseBackend]) -> None:
+    for connection in connections:
+        try:
+            connection.disconnect()
+        except Exception as e:
+            logger.warning("Failed to close Snowflake connection: {}", e)
+
+
+@contextmanager
+def pooled_connection(connection_info: SnowflakeConnectionInfo):
+    key = fingerprint(connection_info)
+    with _connection_pool_lock:
+        entry = _connection_pool.get(key)
+        if entry is not None:
+            entry.leases += 1
+            # re-insert to restart the idle timer
+            _connection_pool[key] = entry
+        closable = _retire(_connection_pool.pop_evicted())
+    _disconnect(closable)
+
+    if entry is None:
+        connection = DataSource.snowflake.get_connection(connection_info)
+        with _connection_pool_lock:
+            entry = _connection_pool.setdefault(key, _PoolEntry(connection))
+            entry.leases += 1
+            closable = _retire(_connection_pool.pop_evicted())
+        if entry.connection is not connection:
+            # another thread logged in with the same connection info first
+            closable.append(connection)
+        _disconnect(closable)
+
+    try:
+        yield entry.connection
+    except DatabaseError:
+        # The session may be dead (expired token, aborted session), so make the
+        # next request log in again instead of reusing it.
+        with _connection_pool_lock:
+            if _connection_pool.get(key) is entry:
+                del _connection_pool[key]
+            entry.retired = True
+        raise
+    finally:
+        with _connection_pool_lock:
+            entry.leases -= 1
+            close = entry.retired and entry.leases == 0
+        if close:
+            _disconnect([entry.connection])
+
+
+def warmup_connection_pool() -> None:
+    connection_infos = get_config().get_snowflake_warmup_connection_info()
+    if not connection_infos:
+        return
+    with logger.contextualize(correlation_id="warmup"):
+        try:
+            for connection_info in TypeAdapter(
+                list[SnowflakeConnectionInfo]
+            ).validate_json(connection_infos):
+                with pooled_connection(connection_info):
+                    pass
+        except Exception as e:
+            logger.warning("Failed to warm up Snowflake connection pool: {}", e)
+
 
 class SnowflakeMetadata(Metadata):
-    def __init__(self, connection_info: SnowflakeConnectionInfo):
-        super().__init__(connection_info)
-        self.connection = DataSource.snowflake.get_connection(connection_info)
+    cache_enabled = True
 
     def get_table_list(self) -> list[Table]:
-        schema = self._get_schema_name()
-        sql = f"""
-            SELECT
-                c.TABLE_CATALOG AS TABLE_CATALOG,
-                c.TABLE_SCHEMA AS TABLE_SCHEMA,
-                c.TABLE_NAME AS TABLE_NAME,
-                c.COLUMN_NAME AS COLUMN_NAME,
-                c.DATA_TYPE AS DATA_TYPE,
-                c.IS_NULLABLE AS IS_NULLABLE,
-                c.COMMENT AS COLUMN_COMMENT,
-                t.COMMENT AS TABLE_COMMENT
-            FROM
-                INFORMATION_SCHEMA.COLUMNS c
-            JOIN
-                INFORMATION_SCHEMA.TABLES t
-                ON c.TABLE_SCHEMA = t.TABLE_SCHEMA
-                AND c.TABLE_NAME = t.TABLE_NAME
-            WHERE
-                c.TABLE_SCHEMA = '{schema}';
-        """
-        response = self.connection.sql(sql).to_pandas().to_dict(orient="records")
-
-        unique_tables = {}
-        for row in response:
-            # generate unique table name
-            schema_table = self._format_compact_table_name(
-                row["TABLE_SCHEMA"], row["TABLE_NAME"]
+        return self.get_tables_and_constraints()[0]
+
+    def get_constraints(self) -> list[Constraint]:
+        return self.get_tables_and_constraints()[1]
+
+    @cache_metadata
+    def get_tables_and_constraints(self) -> tuple[list[Table], list[Constraint]]:
+        # Send both statements in one request so a cold warehouse only pays the
+        # round-trip once; the other endpoint is then served from the cache.
+        sql = f"{_TABLE_LIST_SQL};\n{self._get_constraints_sql()}"
+        with pooled_connection(self.connection_info) as connection:
+            try:
+                cur = connection.raw_sql(
+                    sql, params={"schema": self._get_schema_name()}, num_statements=2
+                )
+            except ProgrammingError as e:
+                if e.errno != _STATEMENT_COUNT_MISMATCH_ERRNO:
+                    raise
+                # the account does not accept multi-statement requests
+                return (
+                    self._query_table_list(connection),
+                    self._query_constraints(connection),
+                )
+            with closing(cur):
+                tables = self._to_tables(cur.fetch_arrow_all())
+                cur.nextset()
+                return tables, self._to_constraints(cur)
+
+    @cache_metadata
+    def get_version(self) -> str:
+        with (
+            pooled_connection(self.connection_info) as connection,
+            closing(connection.raw_sql("SELECT CURRENT_VERSION()")) as cur,
+        ):
+            return cur.fetchone()[0]
+
+    def _query_table_list(self, connection: BaseBackend) -> list[Table]:
+        with closing(
+            connection.raw_sql(
+                _TABLE_LIST_SQL, params={"schema": self._get_schema_name()}
             )
-            # init table if not exists
-            if schema_table not in unique_tables:
-                unique_tables[schema_table] = Table(
-                    name=schema_table,
-                    description=row["TABLE_COMMENT"],
-                    columns=[],
-                    properties=TableProperties(
-                        schema=row["TABLE_SCHEMA"],
-                        catalog=row["TABLE_CATALOG"],
-                        table=row["TABLE_NAME"],
-                    ),
-                    primaryKey="",
+        ) as cur:
+            return self._to_tables(cur.fetch_arrow_all())
+
+    def _query_constraints(self, connection: BaseBackend) -> list[Constraint]:
+        with closing(connection.raw_sql(self._get_constraints_sql())) as cur:
+            return self._to_constraints(cur)
+
+    def _get_constraints_sql(self) -> str:
+        database = self._get_database_name()
+        schema = self._get_schema_name()
+        return f"SHOW IMPORTED KEYS IN SCHEMA {database}.{schema}"
+
+    def _to_tables(self, response) -> list[Table]:
+        if response is None:
+            return []
+        rows = map(
+            _TableListRow._make,
+            zip(
+                *(
+                    response.column(name.upper()).to_pylist()
+                    for name in _TableListRow._fields
                 )
+            ),
+        )
 
-            # table exists, and add column to the table
-            unique_tables[schema_table].columns.append(
+        tables = []
+        # rows are ordered by table, so each group holds all columns of one table
+        for (table_schema, table_name), group in groupby(
+            rows, key=attrgetter("table_schema", "table_name")
+        ):
+            table_rows = list(group)
+            columns = [
                 Column(
-                    name=row["COLUMN_NAME"],
-                    type=self._transform_column_type(row["DATA_TYPE"]),
-                    notNull=row["IS_NULLABLE"].lower() == "no",
-                    description=row["COLUMN_COMMENT"],
+                    name=row.column_name,
+                    type=self._transform_column_type(row.data_type),
+                    notNull=row.is_nullable == "NO",
+                    description=row.column_comment,
                     properties=None,
                 )
+                for row in table_rows
+            ]
+            tables.append(
+                Table(
+                    name=self._format_compact_table_name(table_schema, table_name),
+                    description=table_rows[0].table_comment,
+                    columns=columns,
+                    properties=TableProperties(
+                        schema=table_schema,
+                        catalog=table_rows[0].table_catalog,
+                        table=table_name,
+                    ),
+                    primaryKey="",
+                )
             )
-        return list(unique_tables.values())
+        return tables
 
-    def get_constraints(self) -> list[Constraint]:
-        database = self._get_database_name()
-        schema = self._get_schema_name()
-        sql = f"""
-            SHOW IMPORTED KEYS IN SCHEMA {database}.{schema};
-        """
-        with closing(self.connection.raw_sql(sql)) as cur:
-            fields = [field[0] for field in cur.description]
-            res = [dict(zip(fields, row)) for row in cur.fetchall()]
-            constraints = []
-            for row in res:
-                constraints.append(
-                    Constraint(
-                        constraintName=self._format_constraint_name(
-                            row["pk_table_name"],
-                            row["pk_column_name"],
-                            row["fk_table_name"],
-                            row["fk_column_name"],
-                        ),
-                        constraintTable=self._format_compact_table_name(
-                            row["pk_schema_name"], row["pk_table_name"]
-                        ),
-                        constraintColumn=row["pk_column_name"],
-                        constraintedTable=self._format_compact_table_name(
-                            row["fk_schema_name"], row["fk_table_name"]
-                        ),
-                        constraintedColumn=row["fk_column_name"],
-                        constraintType=ConstraintType.FOREIGN_KEY,
-                    )
-                )
-            return constraints
+    def _to_constraints(self, cur) -> list[Constraint]:
+        try:
+            response = cur.fetch_arrow_all()
+            if response is None:
+                return []
+            rows = zip(
+                *(response.column(name).to_pylist() for name in _ConstraintRow._fields)
+            )
+        except NotSupportedError:
+            # metadata commands like SHOW can answer in JSON instead of Arrow
+            rows = cur.fetchall()
+            if not rows:
+                return []
+            idx = {field[0]: i for i, field in enumerate(cur.description)}
+            rows = ([row[idx[name]] for name in _ConstraintRow._fields] for row in rows)
 
-    def get_version(self) -> str:
-        return self.connection.sql("SELECT CURRENT_VERSION()").to_pandas().iloc[0, 0]
+        return [
+            Constraint(
+                constraintName=f"{row.pk_table_name}_{row.pk_column_name}_{row.fk_table_name}_{row.fk_column_name}",
+                constraintTable=self._format_compact_table_name(
+                    row.pk_schema_name, row.pk_table_name
+                ),
+                constraintColumn=row.pk_column_name,
+                constraintedTable=self._format_compact_table_name(
+                    row.fk_schema_name, row.fk_table_name
+                ),
+                constraintedColumn=row.fk_column_name,
+                constraintType=ConstraintType.FOREIGN_KEY,
+            )
+            for row in map(_ConstraintRow._make, rows)
+        ]
 
     def _get_database_name(self):
         return self.connection_info.database.get_secret_value()
@@ -117,45 +363,5 @@ class SnowflakeMetadata(Metadata):
     def _format_compact_table_name(self, schema: str, table: str):
         return f"{schema}.{table}"
 
-    def _format_constraint_name(
-        self, table_name, column_name, referenced_table_name, referenced_column_name
-    ):
-        return f"{table_name}_{column_name}_{referenced_table_name}_{referenced_column_name}"
-
     def _transform_column_type(self, data_type):
-        # all possible types listed here: https://docs.snowflake.com/en/sql-reference/intro-summary-data-types
-        switcher = {
-            # Numeric Types
-            "number": RustWrenEngineColumnType.NUMERIC,
-            "decimal": RustWrenEngineColumnType.NUMERIC,
-            "numeric": RustWrenEngineColumnType.NUMERIC,
-            "int": RustWrenEngineColumnType.INTEGER,
-            "integer": RustWrenEngineColumnType.INTEGER,
-            "bigint": RustWrenEngineColumnType.BIGINT,
-            "smallint": RustWrenEngineColumnType.SMALLINT,
-            "tinyint": RustWrenEngineColumnType.TINYINT,
-            "byteint": RustWrenEngineColumnType.TINYINT,
-            # Float
-            "float4": RustWrenEngineColumnType.FLOAT4,
-            "float": RustWrenEngineColumnType.FLOAT8,
-            "float8": RustWrenEngineColumnType.FLOAT8,
-            "double": RustWrenEngineColumnType.DOUBLE,
-            "double precision": RustWrenEngineColumnType.DOUBLE,
-            "real": RustWrenEngineColumnType.REAL,
-            # String Types
-            "varchar": RustWrenEngineColumnType.VARCHAR,
-            "char": RustWrenEngineColumnType.CHAR,
-            "character": RustWrenEngineColumnType.CHAR,
-            "string": RustWrenEngineColumnType.STRING,
-            "text": RustWrenEngineColumnType.TEXT,
-            # Boolean
-            "boolean": RustWrenEngineColumnType.BOOL,
-            # Date and Time Types
-            "date": RustWrenEngineColumnType.DATE,
-            "datetime": RustWrenEngineColumnType.TIMESTAMP,
-            "timestamp": RustWrenEngineColumnType.TIMESTAMP,
-            "timestamp_ntz": RustWrenEngineColumnType.TIMESTAMP,
-            "timestamp_tz": RustWrenEngineColumnType.TIMESTAMPTZ,
-        }
-
-        return switcher.get(data_type.lower(), RustWrenEngineColumnType.UNKNOWN)
+        return _TYPE_MAP.get(data_type.lower(), RustWrenEngineColumnType.UNKNOWN)
@@ -17,6 +17,7 @@ from app.model import (
 )
 from app.model.connector import Connector
 from app.model.data_source import DataSource
+from app.model.metadata.cache import invalidate_metadata
 from app.model.metadata.dto import Constraint, MetadataDTO, Table
 from app.model.metadata.factory import MetadataFactory
 from app.model.validator import Validator
@@ -122,6 +123,15 @@ def get_db_version(data_source: DataSource, dto: MetadataDTO) -> str:
     return MetadataFactory.get_metadata(data_source, dto.connection_info).get_version()
 
 
+@router.post("/{data_source}/metadata/invalidate")
+def invalidate_metadata_cache(data_source: DataSource, dto: MetadataDTO) -> Response:
+    # checked on the class so that no connection is opened just to be refused
+    if not MetadataFactory.get_metadata_class(data_source).cache_enabled:
+        raise NotImplementedError(f"{data_source} does not cache metadata")
+    invalidate_metadata(dto.connection_info)
+    return Response(status_code=204)
+
+
 @router.post("/dry-plan")
 async def dry_plan(
     dto: DryPlanDTO,
@@ -14,6 +14,11 @@ def file_path(path: str) -> str:
 DATAFUSION_FUNCTION_COUNT = 273
 
 
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
 @pytest.fixture(scope="session")
 async def client() -> AsyncClient:
     async with LifespanManager(app) as manager:
@@ -0,0 +1,30 @@
+import pytest
+
+from app.model import SnowflakeConnectionInfo
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def timer():
+    # pass as the timer of a TTLCache and move `now` to expire its entries
+    return FakeTimer()
+
+
+@pytest.fixture
+def connection_info():
+    return SnowflakeConnectionInfo.model_validate(
+        {
+            "user": "user",
+            "password": "password",
+            "account": "account",
+            "database": "DB",
+            "schema": "PUBLIC",
+        }
+    )
@@ -0,0 +1,54 @@
+import pytest
+from cachetools import TTLCache
+from pydantic import SecretStr
+
+from app.model.metadata import cache
+from app.model.metadata.cache import cache_metadata, invalidate_metadata
+
+
+class FakeMetadata:
+    calls = 0
+
+    def __init__(self, connection_info):
+        self.connection_info = connection_info
+
+    @cache_metadata
+    def get_table_list(self):
+        FakeMetadata.calls += 1
+        return [{"name": "orders"}]
+
+
+@pytest.fixture
+def metadata_cache(monkeypatch, timer):
+    monkeypatch.setattr(cache, "_cache", TTLCache(maxsize=256, ttl=300, timer=timer))
+    monkeypatch.setattr(FakeMetadata, "calls", 0)
+
+
+def test_cache_hit(metadata_cache, connection_info):
+    assert FakeMetadata(connection_info).get_table_list() == [{"name": "orders"}]
+    assert FakeMetadata(connection_info).get_table_list() == [{"name": "orders"}]
+    assert FakeMetadata.calls == 1
+
+
+def test_cache_miss_after_ttl(metadata_cache, timer, connection_info):
+    FakeMetadata(connection_info).get_table_list()
+    timer.now = 301
+    FakeMetadata(connection_info).get_table_list()
+    assert FakeMetadata.calls == 2
+
+
+def test_cache_key_includes_credentials(metadata_cache, connection_info):
+    rotated = connection_info.model_copy(update={"password": SecretStr("rotated")})
+    FakeMetadata(connection_info).get_table_list()
+    FakeMetadata(rotated).get_table_list()
+    assert FakeMetadata.calls == 2
+
+
+def test_invalidate_metadata(metadata_cache, connection_info):
+    other = connection_info.model_copy(update={"database": SecretStr("OTHER")})
+    FakeMetadata(connection_info).get_table_list()
+    FakeMetadata(other).get_table_list()
+    invalidate_metadata(connection_info)
+    FakeMetadata(connection_info).get_table_list()
+    FakeMetadata(other).get_table_list()
+    assert FakeMetadata.calls == 3
@@ -0,0 +1,340 @@
+from types import SimpleNamespace
+
+import pyarrow as pa
+import pytest
+from cachetools import TTLCache
+from pydantic import SecretStr
+from snowflake.connector.errors import (
+    NotSupportedError,
+    OperationalError,
+    ProgrammingError,
+)
+
+from app.model.metadata import cache, snowflake
+from app.model.metadata.dto import (
+    Column,
+    Constraint,
+    ConstraintType,
+    RustWrenEngineColumnType,
+    Table,
+    TableProperties,
+)
+from app.model.metadata.snowflake import SnowflakeMetadata, pooled_connection
+
+tables = pa.table(
+    {
+        "TABLE_CATALOG": ["DB"] * 5,
+        "TABLE_SCHEMA": ["PUBLIC"] * 5,
+        "TABLE_NAME": ["CUSTOMER", "CUSTOMER", "ORDERS", "ORDERS", "ORDERS"],
+        "COLUMN_NAME": ["C_CUSTKEY", "C_NAME", "O_CUSTKEY", "O_ORDERDATE", "O_GEO"],
+        "DATA_TYPE": ["NUMBER", "TEXT", "NUMBER", "TIMESTAMP_NTZ", "GEOGRAPHY"],
+        "IS_NULLABLE": ["NO", "YES", "YES", "NO", "YES"],
+        "COLUMN_COMMENT": [None, "customer name", None, None, None],
+        "TABLE_COMMENT": ["customers", "customers", None, None, None],
+    }
+)
+
+constraints = pa.table(
+    {
+        "pk_schema_name": ["PUBLIC"],
+        "pk_table_name": ["CUSTOMER"],
+        "pk_column_name": ["C_CUSTKEY"],
+        "fk_schema_name": ["PUBLIC"],
+        "fk_table_name": ["ORDERS"],
+        "fk_column_name": ["O_CUSTKEY"],
+    }
+)
+
+
+class FakeCursor:
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def fetchone(self):
+        return self.results[0]
+
+    def fetch_arrow_all(self):
+        return self.results[0]
+
+    def nextset(self):
+        self.results.pop(0)
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, multi_statement_error=None):
+        self.multi_statement_error = multi_statement_error
+        self.executed = []
+        self.closed = False
+
+    def raw_sql(self, sql, num_statements=1, **kwargs):
+        self.executed.append(sql)
+        if num_statements > 1:
+            if self.multi_statement_error:
+                raise self.multi_statement_error
+            return FakeCursor(tables, constraints)
+        if sql.startswith("SHOW"):
+            return FakeCursor(constraints)
+        if "CURRENT_VERSION" in sql:
+            return FakeCursor(("9.0.0",))
+        return FakeCursor(tables)
+
+    def disconnect(self):
+        self.closed = True
+
+
+@pytest.fixture
+def logins(monkeypatch, timer):
+    logins = []
+
+    def get_connection(info):
+        logins.append(FakeConnection())
+        return logins[-1]
+
+    monkeypatch.setattr(
+        snowflake,
+        "DataSource",
+        SimpleNamespace(snowflake=SimpleNamespace(get_connection=get_connection)),
+    )
+    monkeypatch.setattr(
+        snowflake,
+        "_connection_pool",
+        snowflake._ConnectionPool(maxsize=2, ttl=600, timer=timer),
+    )
+    monkeypatch.setattr(cache, "_cache", TTLCache(maxsize=256, ttl=300))
+    return logins
+
+
+def test_cached_metadata_does_not_connect(logins, connection_info):
+    assert SnowflakeMetadata(connection_info).get_version() == "9.0.0"
+    assert SnowflakeMetadata(connection_info).get_version() == "9.0.0"
+    assert len(logins) == 1
+    assert logins[0].executed == ["SELECT CURRENT_VERSION()"]
+
+
+def test_pooled_connection_is_reused(logins, connection_info):
+    with pooled_connection(connection_info) as first:
+        pass
+    with pooled_connection(connection_info) as second:
+        pass
+    assert first is second
+    assert len(logins) == 1
+
+
+def test_idle_connection_is_closed(logins, timer, connection_info):
+    with pooled_connection(connection_info) as first:
+        pass
+    timer.now = 601
+    with pooled_connection(connection_info) as second:
+        pass
+    assert second is not first
+    assert first.closed
+    assert not second.closed
+
+
+def test_evicted_connection_is_closed(logins, connection_info):
+    for i in range(3):
+        with pooled_connection(
+            connection_info.model_copy(update={"user": SecretStr(f"user{i}")})
+        ):
+            pass
+    assert [c.closed for c in logins] == [True, False, False]
+
+
+def test_evicted_connection_is_closed_after_release(logins, connection_info):
+    with pooled_connection(connection_info) as first:
+        for i in range(2):
+            with pooled_connection(
+                connection_info.model_copy(update={"user": SecretStr(f"user{i}")})
+            ):
+                pass
+        assert not first.closed
+    assert first.closed
+
+
+def test_duplicate_connection_is_closed(logins, monkeypatch, connection_info):
+    pooled = FakeConnection()
+
+    def get_connection(info):
+        # another thread finishes logging in while this one is still connecting
+        snowflake._connection_pool[cache.fingerprint(info)] = snowflake._PoolEntry(
+            pooled
+        )
+        logins.append(FakeConnection())
+        return logins[-1]
+
+    monkeypatch.setattr(
+        snowflake.DataSource.snowflake, "get_connection", get_connection
+    )
+    with pooled_connection(connection_info) as connection:
+        assert connection is pooled
+    assert logins[0].closed
+    assert not pooled.closed
+
+
+def test_failed_connection_is_replaced(logins, connection_info):
+    with pytest.raises(OperationalError):
+        with pooled_connection(connection_info) as first:
+            raise OperationalError
+    assert first.closed
+    with pooled_connection(connection_info) as second:
+        assert second is not first
+    assert len(logins) == 2
+
+
+def test_tables_and_constraints_share_one_request(logins, connection_info):
+    metadata = SnowflakeMetadata(connection_info)
+    assert len(metadata.get_table_list()) == 2
+    assert len(SnowflakeMetadata(connection_info).get_constraints()) == 1
+    assert len(logins[0].executed) == 1
+
+
+def test_multi_statement_fallback(logins, connection_info):
+    connection = FakeConnection(ProgrammingError(errno=8))
+    snowflake._connection_pool[cache.fingerprint(connection_info)] = (
+        snowflake._PoolEntry(connection)
+    )
+    tables, constraints = SnowflakeMetadata(
+        connection_info
+    ).get_tables_and_constraints()
+    assert len(tables) == 2
+    assert len(constraints) == 1
+    assert len(connection.executed) == 3
+
+
+def test_multi_statement_other_error_is_raised(logins, connection_info):
+    connection = FakeConnection(ProgrammingError(errno=2003))
+    snowflake._connection_pool[cache.fingerprint(connection_info)] = (
+        snowflake._PoolEntry(connection)
+    )
+    with pytest.raises(ProgrammingError):
+        SnowflakeMetadata(connection_info).get_tables_and_constraints()
+    assert len(connection.executed) == 1
+    assert connection.closed
+
+
+class JsonCursor:
+    # SHOW commands can answer in JSON, which the connector cannot read as Arrow
+    description = [
+        ("created_on",),
+        ("pk_database_name",),
+        ("pk_schema_name",),
+        ("pk_table_name",),
+        ("pk_column_name",),
+        ("fk_database_name",),
+        ("fk_schema_name",),
+        ("fk_table_name",),
+        ("fk_column_name",),
+    ]
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetch_arrow_all(self):
+        raise NotSupportedError
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_to_tables(connection_info):
+    result = SnowflakeMetadata(connection_info)._to_tables(tables)
+    assert [table.model_dump(mode="json") for table in result] == [
+        Table(
+            name="PUBLIC.CUSTOMER",
+            description="customers",
+            columns=[
+                Column(
+                    name="C_CUSTKEY",
+                    type=RustWrenEngineColumnType.NUMERIC,
+                    notNull=True,
+                    description=None,
+                    properties=None,
+                ),
+                Column(
+                    name="C_NAME",
+                    type=RustWrenEngineColumnType.TEXT,
+                    notNull=False,
+                    description="customer name",
+                    properties=None,
+                ),
+            ],
+            properties=TableProperties(schema="PUBLIC", catalog="DB", table="CUSTOMER"),
+            primaryKey="",
+        ).model_dump(mode="json"),
+        Table(
+            name="PUBLIC.ORDERS",
+            description=None,
+            columns=[
+                Column(
+                    name="O_CUSTKEY",
+                    type=RustWrenEngineColumnType.NUMERIC,
+                    notNull=False,
+                    description=None,
+                    properties=None,
+                ),
+                Column(
+                    name="O_ORDERDATE",
+                    type=RustWrenEngineColumnType.TIMESTAMP,
+                    notNull=True,
+                    description=None,
+                    properties=None,
+                ),
+                Column(
+                    name="O_GEO",
+                    type=RustWrenEngineColumnType.UNKNOWN,
+                    notNull=False,
+                    description=None,
+                    properties=None,
+                ),
+            ],
+            properties=TableProperties(schema="PUBLIC", catalog="DB", table="ORDERS"),
+            primaryKey="",
+        ).model_dump(mode="json"),
+    ]
+
+
+def test_to_tables_empty(connection_info):
+    assert SnowflakeMetadata(connection_info)._to_tables(None) == []
+
+
+expected_constraint = Constraint(
+    constraintName="CUSTOMER_C_CUSTKEY_ORDERS_O_CUSTKEY",
+    constraintTable="PUBLIC.CUSTOMER",
+    constraintColumn="C_CUSTKEY",
+    constraintedTable="PUBLIC.ORDERS",
+    constraintedColumn="O_CUSTKEY",
+    constraintType=ConstraintType.FOREIGN_KEY,
+)
+
+
+def test_to_constraints(connection_info):
+    result = SnowflakeMetadata(connection_info)._to_constraints(FakeCursor(constraints))
+    assert result == [expected_constraint]
+
+
+def test_to_constraints_from_json(connection_info):
+    cursor = JsonCursor(
+        [
+            (
+                "2025-01-01",
+                "DB",
+                "PUBLIC",
+                "CUSTOMER",
+                "C_CUSTKEY",
+                "DB",
+                "PUBLIC",
+                "ORDERS",
+                "O_CUSTKEY",
+            )
+        ]
+    )
+    result = SnowflakeMetadata(connection_info)._to_constraints(cursor)
+    assert result == [expected_constraint]
+
+
+def test_to_constraints_from_json_empty(connection_info):
+    assert SnowflakeMetadata(connection_info)._to_constraints(JsonCursor([])) == []
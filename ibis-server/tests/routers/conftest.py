@@ -11,8 +11,3 @@ def pytest_collection_modifyitems(items):
         if pathlib.Path(item.fspath).is_relative_to(current_file_dir):
             item.add_marker(pytestmark)
             item.fixturenames.append("anyio_backend")
-
-
-@pytest.fixture(scope="session")
-def anyio_backend():
-    return "asyncio"
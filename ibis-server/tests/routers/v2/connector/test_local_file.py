@@ -233,6 +233,17 @@ async def test_metadata_db_version(client, connection_info):
     assert "Local File System" in response.text
 
 
+async def test_metadata_invalidate_not_supported(client, connection_info):
+    response = await client.post(
+        url=f"{base_url}/metadata/invalidate",
+        json={
+            "connectionInfo": connection_info,
+        },
+    )
+    assert response.status_code == 501
+    assert response.text == "local_file does not cache metadata"
+
+
 async def test_unsupported_format(client):
     response = await client.post(
         url=f"{base_url}/metadata/tables",
@@ -79,7 +79,8 @@ mssql_image = "mcr.microsoft.com/mssql/server:2019-CU27-ubuntu-20.04"
 @pytest.fixture(scope="module")
 def mssql(request) -> SqlServerContainer:
     mssql = SqlServerContainer(mssql_image, dialect="mssql+pyodbc").start()
-    engine = sqlalchemy.create_engine(_to_connection_url(mssql))
+    # send the rows in bulk instead of one round-trip per INSERT
+    engine = sqlalchemy.create_engine(_to_connection_url(mssql), fast_executemany=True)
     pd.read_parquet(file_path("resource/tpch/data/orders.parquet")).to_sql(
         "orders", engine, index=False
     )
@@ -319,3 +319,11 @@ async def test_metadata_get_version(client):
     )
     assert response.status_code == 200
     assert response.text is not None
+
+
+async def test_metadata_invalidate(client):
+    response = await client.post(
+        url=f"{base_url}/metadata/invalidate",
+        json={"connectionInfo": connection_info},
+    )
+    assert response.status_code == 204
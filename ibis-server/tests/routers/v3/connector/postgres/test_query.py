@@ -1,10 +1,12 @@
-import base64
-
+import anyio
 import orjson
+import pybase64
 import pytest
 
 from tests.routers.v3.connector.postgres.conftest import base_url
 
+query_url = f"{base_url}/query"
+
 manifest = {
     "catalog": "wren",
     "schema": "public",
@@ -91,15 +93,45 @@ manifest = {
     ],
 }
 
+manifest_b64 = pybase64.b64encode_as_string(orjson.dumps(manifest))
+
+expected_row = [
+    "2024-01-01 23:59:59.000000",
+    "2024-01-01 23:59:59.000000 UTC",
+    "2024-01-16 04:00:00.000000 UTC",  # utc-5
+    "2024-07-16 03:00:00.000000 UTC",  # utc-4
+    "172799.49",
+    "1_370",
+    370,
+    "1996-01-02 00:00:00.000000",
+    1,
+    "O",
+]
+
+expected_dtypes = {
+    "o_orderkey": "int32",
+    "o_custkey": "int32",
+    "o_orderstatus": "object",
+    "o_totalprice_double": "float64",
+    "o_orderdate": "object",
+    "order_cust_key": "object",
+    "timestamp": "object",
+    "timestamptz": "object",
+    "dst_utc_minus_5": "object",
+    "dst_utc_minus_4": "object",
+}
+
 
 @pytest.fixture(scope="module")
 def manifest_str():
-    return base64.b64encode(orjson.dumps(manifest)).decode("utf-8")
+    return manifest_b64
 
 
+@pytest.mark.benchmark
 async def test_query(client, manifest_str, connection_info):
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         json={
             "connectionInfo": connection_info,
             "manifestStr": manifest_str,
@@ -107,38 +139,17 @@ async def test_query(client, manifest_str, connection_info):
         },
     )
     assert response.status_code == 200
-    result = response.json()
+    result = orjson.loads(response.content)
     assert len(result["columns"]) == 10
     assert len(result["data"]) == 1
-    assert result["data"][0] == [
-        "2024-01-01 23:59:59.000000",
-        "2024-01-01 23:59:59.000000 UTC",
-        "2024-01-16 04:00:00.000000 UTC",  # utc-5
-        "2024-07-16 03:00:00.000000 UTC",  # utc-4
-        "172799.49",
-        "1_370",
-        370,
-        "1996-01-02 00:00:00.000000",
-        1,
-        "O",
-    ]
-    assert result["dtypes"] == {
-        "o_orderkey": "int32",
-        "o_custkey": "int32",
-        "o_orderstatus": "object",
-        "o_totalprice_double": "float64",
-        "o_orderdate": "object",
-        "order_cust_key": "object",
-        "timestamp": "object",
-        "timestamptz": "object",
-        "dst_utc_minus_5": "object",
-        "dst_utc_minus_4": "object",
-    }
+    assert result["data"][0] == expected_row
+    assert result["dtypes"] == expected_dtypes
 
 
 async def test_query_with_connection_url(client, manifest_str, connection_url):
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         json={
             "connectionInfo": {"connectionUrl": connection_url},
             "manifestStr": manifest_str,
@@ -146,7 +157,7 @@ async def test_query_with_connection_url(client, manifest_str, connection_url):
         },
     )
     assert response.status_code == 200
-    result = response.json()
+    result = orjson.loads(response.content)
     assert len(result["columns"]) == 10
     assert len(result["data"]) == 1
     assert result["data"][0][0] == "2024-01-01 23:59:59.000000"
@@ -154,36 +165,37 @@ async def test_query_with_connection_url(client, manifest_str, connection_url):
 
 
 async def test_query_with_limit(client, manifest_str, connection_info):
-    response = await client.post(
-        url=f"{base_url}/query",
-        params={"limit": 1},
-        json={
-            "connectionInfo": connection_info,
-            "manifestStr": manifest_str,
-            "sql": "SELECT * FROM wren.public.orders",
-        },
-    )
-    assert response.status_code == 200
-    result = response.json()
-    assert len(result["data"]) == 1
+    responses = []
+
+    async def query(sql):
+        response = await _post(
+            client,
+            url=query_url,
+            params={"limit": 1},
+            json={
+                "connectionInfo": connection_info,
+                "manifestStr": manifest_str,
+                "sql": sql,
+            },
+        )
+        responses.append(response)
 
-    response = await client.post(
-        url=f"{base_url}/query",
-        params={"limit": 1},
-        json={
-            "connectionInfo": connection_info,
-            "manifestStr": manifest_str,
-            "sql": "SELECT * FROM wren.public.orders LIMIT 10",
-        },
-    )
-    assert response.status_code == 200
-    result = response.json()
-    assert len(result["data"]) == 1
+    # the two requests are independent, send them concurrently
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(query, "SELECT * FROM wren.public.orders")
+        tg.start_soon(query, "SELECT * FROM wren.public.orders LIMIT 10")
+
+    assert len(responses) == 2
+    for response in responses:
+        assert response.status_code == 200
+        result = orjson.loads(response.content)
+        assert len(result["data"]) == 1
 
 
 async def test_query_with_invalid_manifest_str(client, connection_info):
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         json={
             "connectionInfo": connection_info,
             "manifestStr": "xxx",
@@ -191,57 +203,32 @@ async def test_query_with_invalid_manifest_str(client, connection_info):
         },
     )
     assert response.status_code == 422
-    assert response.text == "Base64 decode error: Invalid padding"
+    assert response.content == b"Base64 decode error: Invalid padding"
 
 
-async def test_query_without_manifest(client, connection_info):
-    response = await client.post(
-        url=f"{base_url}/query",
-        json={
-            "connectionInfo": connection_info,
-            "sql": "SELECT * FROM wren.public.orders LIMIT 1",
-        },
-    )
-    assert response.status_code == 422
-    result = response.json()
-    assert result["detail"][0] is not None
-    assert result["detail"][0]["type"] == "missing"
-    assert result["detail"][0]["loc"] == ["body", "manifestStr"]
-    assert result["detail"][0]["msg"] == "Field required"
-
-
-async def test_query_without_sql(client, manifest_str, connection_info):
-    response = await client.post(
-        url=f"{base_url}/query",
-        json={"connectionInfo": connection_info, "manifestStr": manifest_str},
-    )
-    assert response.status_code == 422
-    result = response.json()
-    assert result["detail"][0] is not None
-    assert result["detail"][0]["type"] == "missing"
-    assert result["detail"][0]["loc"] == ["body", "sql"]
-    assert result["detail"][0]["msg"] == "Field required"
-
-
-async def test_query_without_connection_info(client, manifest_str):
-    response = await client.post(
-        url=f"{base_url}/query",
-        json={
-            "manifestStr": manifest_str,
-            "sql": "SELECT * FROM wren.public.orders LIMIT 1",
-        },
-    )
+@pytest.mark.parametrize("missing_field", ["manifestStr", "sql", "connectionInfo"])
+async def test_query_without_required_field(
+    client, manifest_str, connection_info, missing_field
+):
+    payload = {
+        "connectionInfo": connection_info,
+        "manifestStr": manifest_str,
+        "sql": "SELECT * FROM wren.public.orders LIMIT 1",
+    }
+    del payload[missing_field]
+    response = await _post(client, url=query_url, json=payload)
     assert response.status_code == 422
-    result = response.json()
+    result = orjson.loads(response.content)
     assert result["detail"][0] is not None
     assert result["detail"][0]["type"] == "missing"
-    assert result["detail"][0]["loc"] == ["body", "connectionInfo"]
+    assert result["detail"][0]["loc"] == ["body", missing_field]
     assert result["detail"][0]["msg"] == "Field required"
 
 
 async def test_query_with_dry_run(client, manifest_str, connection_info):
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         params={"dryRun": True},
         json={
             "connectionInfo": connection_info,
@@ -255,8 +242,9 @@ async def test_query_with_dry_run(client, manifest_str, connection_info):
 async def test_query_with_dry_run_and_invalid_sql(
     client, manifest_str, connection_info
 ):
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         params={"dryRun": True},
         json={
             "connectionInfo": connection_info,
@@ -265,12 +253,13 @@ async def test_query_with_dry_run_and_invalid_sql(
         },
     )
     assert response.status_code == 422
-    assert response.text is not None
+    assert response.content
 
 
 async def test_query_to_many_calculation(client, manifest_str, connection_info):
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         json={
             "connectionInfo": connection_info,
             "manifestStr": manifest_str,
@@ -278,13 +267,14 @@ async def test_query_to_many_calculation(client, manifest_str, connection_info):
         },
     )
     assert response.status_code == 200
-    result = response.json()
+    result = orjson.loads(response.content)
     assert len(result["columns"]) == 1
     assert len(result["data"]) == 1
     assert result["dtypes"] == {"sum_totalprice": "float64"}
 
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         json={
             "connectionInfo": connection_info,
             "manifestStr": manifest_str,
@@ -292,13 +282,14 @@ async def test_query_to_many_calculation(client, manifest_str, connection_info):
         },
     )
     assert response.status_code == 200
-    result = response.json()
+    result = orjson.loads(response.content)
     assert len(result["columns"]) == 1
     assert len(result["data"]) == 1
     assert result["dtypes"] == {"sum_totalprice": "float64"}
 
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         json={
             "connectionInfo": connection_info,
             "manifestStr": manifest_str,
@@ -306,13 +297,14 @@ async def test_query_to_many_calculation(client, manifest_str, connection_info):
         },
     )
     assert response.status_code == 200
-    result = response.json()
+    result = orjson.loads(response.content)
     assert len(result["columns"]) == 2
     assert len(result["data"]) == 1
     assert result["dtypes"] == {"c_name": "object", "sum_totalprice": "float64"}
 
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         json={
             "connectionInfo": connection_info,
             "manifestStr": manifest_str,
@@ -320,7 +312,7 @@ async def test_query_to_many_calculation(client, manifest_str, connection_info):
         },
     )
     assert response.status_code == 200
-    result = response.json()
+    result = orjson.loads(response.content)
     assert len(result["columns"]) == 2
     assert len(result["data"]) == 1
     assert result["dtypes"] == {"c_custkey": "int32", "sum_totalprice": "float64"}
@@ -328,8 +320,9 @@ async def test_query_to_many_calculation(client, manifest_str, connection_info):
 
 @pytest.mark.skip(reason="Datafusion does not implement filter yet")
 async def test_query_with_keyword_filter(client, manifest_str, connection_info):
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         json={
             "connectionInfo": connection_info,
             "manifestStr": manifest_str,
@@ -337,12 +330,13 @@ async def test_query_with_keyword_filter(client, manifest_str, connection_info):
         },
     )
     assert response.status_code == 200
-    assert response.text is not None
+    assert response.content
 
 
 async def test_limit_pushdown(client, manifest_str, connection_info):
-    response = await client.post(
-        url=f"{base_url}/query",
+    response = await _post(
+        client,
+        url=query_url,
         params={"limit": 10},
         json={
             "connectionInfo": connection_info,
@@ -351,5 +345,15 @@ async def test_limit_pushdown(client, manifest_str, connection_info):
         },
     )
     assert response.status_code == 200
-    result = response.json()
+    result = orjson.loads(response.content)
     assert len(result["data"]) == 10
+
+
+def _post(client, url, json, **kwargs):
+    # serialize with orjson rather than the stdlib json encoder used by httpx
+    return client.post(
+        url,
+        content=orjson.dumps(json),
+        headers={"Content-Type": "application/json"},
+        **kwargs,
+    )
@@ -3,11 +3,6 @@ import pytest
 pytestmark = pytest.mark.anyio
 
 
-@pytest.fixture(scope="session")
-def anyio_backend():
-    return "asyncio"
-
-
 async def test_root(client):
     response = await client.get("/")
     assert response.status_code == 307